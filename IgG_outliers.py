@@ -1,6 +1,20 @@
+import argparse
+import os
+
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
+from scipy.cluster.hierarchy import leaves_list, linkage
+from scipy.spatial.distance import squareform
+
+# Smallest font (pt) worth drawing for tick labels and per-cell values in report mode
+MIN_FONTSIZE = 4
+MAX_FONTSIZE = 10
+# Rows symmetrised per step in cluster_order, bounding its scratch memory
+SYMMETRISE_BLOCK = 256
+# Per-cell text is slow to render, so larger matrices are left unannotated
+MAX_ANNOTATED_CELLS = 5000
 
 
 data = {
@@ -14,13 +28,128 @@ data = {
     '38631': [0.0789347626676286, 0.0502736566032051, 0.0509729380861669, 0.202890900410771, 0.0034150760777767, 0.131136967805419, None]
 }
 
-df = pd.DataFrame(data)
-df.to_csv('matrix.csv', index=False)
 
-matrix_df = pd.read_csv('matrix.csv', index_col=0)
-plt.figure(figsize=(10, 8))
-sns.heatmap(matrix_df, cmap='viridis', annot=True, fmt='.2f', linewidths=.5, linecolor='gray')
-plt.title('Matrix Heatmap')
-plt.xlabel('Column')
-plt.ylabel('Row')
-plt.show()
+def plot_matrix_csv():
+    df = pd.DataFrame(data)
+    df.to_csv('matrix.csv', index=False)
+
+    matrix_df = pd.read_csv('matrix.csv', index_col=0)
+    plt.figure(figsize=(10, 8))
+    sns.heatmap(matrix_df, cmap='viridis', annot=True, fmt='.2f', linewidths=.5, linecolor='gray')
+    plt.title('Matrix Heatmap')
+    plt.xlabel('Column')
+    plt.ylabel('Row')
+    plt.show()
+
+
+def load_matrix(matrix_file, labels_file=None):
+    """
+    Memory-map a square correlation matrix. .npy files carry their own shape and dtype,
+    anything else is read as raw float32 with the size taken from the labels file.
+    """
+    labels = None
+    if labels_file:
+        with open(labels_file, 'r') as file:
+            labels = [line.strip() for line in file if line.strip()]
+    if matrix_file.endswith('.npy'):
+        matrix = np.load(matrix_file, mmap_mode='r')
+    else:
+        if labels is None:
+            raise ValueError('--labels is required to size a raw float32 matrix')
+        n = len(labels)
+        expected = n * n * np.dtype(np.float32).itemsize
+        actual = os.path.getsize(matrix_file)
+        if actual != expected:
+            raise ValueError(f'{matrix_file} is {actual} bytes, expected {expected} for {n} labels as a {n}x{n} float32 matrix')
+        matrix = np.memmap(matrix_file, dtype=np.float32, mode='r', shape=(n, n))
+    if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+        raise ValueError(f'Expected a square matrix, got shape {matrix.shape}')
+    if labels is None:
+        labels = [str(i) for i in range(matrix.shape[0])]
+    elif len(labels) != matrix.shape[0]:
+        raise ValueError(f'{len(labels)} labels for a {matrix.shape[0]}x{matrix.shape[0]} matrix')
+    return matrix, labels
+
+
+def cluster_order(corr, method='average'):
+    """
+    Leaf order of a hierarchical clustering on 1 - correlation.
+    Overwrites corr with the symmetrised distance matrix to avoid extra n x n copies.
+    """
+    n = len(corr)
+    if n < 2:
+        return np.arange(n)
+    # Missing values (e.g. the blank diagonal of matrix.csv) are treated as uncorrelated
+    np.nan_to_num(corr, copy=False)
+    # Symmetrise a block of rows at a time so no full transposed copy is needed
+    for i in range(0, n, SYMMETRISE_BLOCK):
+        j = min(i + SYMMETRISE_BLOCK, n)
+        mean = (corr[i:j, i:] + corr[i:, i:j].T) / 2
+        corr[i:j, i:] = mean
+        corr[i:, i:j] = mean.T
+    np.subtract(1, corr, out=corr)
+    np.fill_diagonal(corr, 0)
+    np.clip(corr, 0, None, out=corr)
+    return leaves_list(linkage(squareform(corr, checks=False), method=method))
+
+
+def plot_correlation_report(matrix, labels, output_file, method='average'):
+    n = len(labels)
+    # Cluster on a working copy that cluster_order overwrites with distances
+    corr = np.array(matrix, dtype=np.float32)
+    order = cluster_order(corr, method)
+    del corr
+    # Display the input values unchanged, read back from the (memory-mapped) matrix in cluster order
+    ordered = np.asarray(matrix[np.ix_(order, order)], dtype=np.float32)
+    ordered_labels = [labels[i] for i in order]
+
+    size = min(max(8, n * 0.3), 40)
+    fig, ax = plt.subplots(figsize=(size + 2, size))
+    # imshow draws one image instead of a patch per cell, which keeps large matrices fast
+    image = ax.imshow(np.ma.masked_invalid(ordered), cmap='viridis', interpolation='nearest')
+    fig.colorbar(image, ax=ax)
+    # Size tick labels and annotations from the drawn cell size (pt), dropping them when unreadable
+    cell = ax.get_position().height * size * 72 / max(n, 1)
+    tick_fontsize = min(MAX_FONTSIZE, cell * 0.8)
+    # '0.00' is about 2.5 em wide, leave a margin inside the cell
+    annot_fontsize = min(MAX_FONTSIZE, cell * 0.3)
+    if tick_fontsize >= MIN_FONTSIZE:
+        ax.set_xticks(range(n))
+        ax.set_yticks(range(n))
+        ax.set_xticklabels(ordered_labels, rotation=90, fontsize=tick_fontsize)
+        ax.set_yticklabels(ordered_labels, fontsize=tick_fontsize)
+    else:
+        ax.set_xticks([])
+        ax.set_yticks([])
+    if annot_fontsize >= MIN_FONTSIZE and n * n <= MAX_ANNOTATED_CELLS:
+        # Dark text on light cells and light text on dark cells, as seaborn does
+        colors = image.cmap(image.norm(ordered)).reshape(-1, 4)
+        light = np.reshape(sns.utils.relative_luminance(colors) > .408, (n, n))
+        for i, j in zip(*np.nonzero(~np.isnan(ordered))):
+            ax.text(j, i, f'{ordered[i, j]:.2f}', ha='center', va='center',
+                    color='.15' if light[i, j] else 'w', fontsize=annot_fontsize)
+    ax.set_title(f'Correlation Heatmap ({n} samples, {method} linkage)')
+    fig.savefig(output_file, bbox_inches='tight')
+    plt.close(fig)
+    return ordered_labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Plot the IgG correlation matrix as a heatmap.')
+    parser.add_argument('--matrix', type=str, help='Correlation matrix as .npy or raw float32; enables the clustered report mode')
+    parser.add_argument('--labels', type=str, help='Sample labels, one per line, in matrix order')
+    parser.add_argument('--output', type=str, default='correlation_heatmap.png', help='Report heatmap image')
+    parser.add_argument('--method', type=str, default='average', help='Hierarchical clustering linkage method')
+    args = parser.parse_args()
+
+    if args.matrix is None:
+        plot_matrix_csv()
+        return
+    # Report mode renders straight to file so it can run headless
+    plt.switch_backend('Agg')
+    matrix, labels = load_matrix(args.matrix, args.labels)
+    ordered_labels = plot_correlation_report(matrix, labels, args.output, args.method)
+    print('\n'.join(ordered_labels))
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,9 @@ Input: list of one or more gff format files
 Output: files produced for each input/mode combination:
 MP (matched_pair), D (details), O (orphans), P (frequency preview plot), F (frequency final plot),
 C (statistics graph), statistics.tabular
+
+With --index, each MP output also gets a coordinate-sorted .npz index next to it that can be
+queried by region through cwpair2_index.py.
 """
 
 import argparse
@@ -264,7 +267,7 @@ def create_directories():
 
 
 def process_file(dataset_path, galaxy_hid, method, threshold, up_distance,
-                 down_distance, binsize, output_files):
+                 down_distance, binsize, output_files, index=False):
     if method == 'all':
         match_methods = METHODS.keys()
     else:
@@ -278,7 +281,8 @@ def process_file(dataset_path, galaxy_hid, method, threshold, up_distance,
                                 up_distance,
                                 down_distance,
                                 binsize,
-                                output_files)
+                                output_files,
+                                index)
         statistics.append(stats)
     if output_files == 'all' and method == 'all':
         frequency_plot([s['dist'] for s in statistics],
@@ -288,7 +292,7 @@ def process_file(dataset_path, galaxy_hid, method, threshold, up_distance,
 
 
 def perform_process(dataset_path, galaxy_hid, method, threshold, up_distance,
-                    down_distance, binsize, output_files):
+                    down_distance, binsize, output_files, index=False):
     output_details = output_files in ["all", "matched_pair_orphan_detail"]
     output_plots = output_files in ["all"]
     output_orphans = output_files in ["all", "matched_pair_orphan", "matched_pair_orphan_detail"]
@@ -410,6 +414,7 @@ def perform_process(dataset_path, galaxy_hid, method, threshold, up_distance,
     # Sort output descending by score.
     x.sort(key=lambda data: float(data[5]), reverse=True)
     # Writing a summary to gff format file
+    rows = []
     for row in x:
         row_tmp = list(row)
         # Dataset in tuple cannot be modified in Python, so row will
@@ -424,6 +429,11 @@ def perform_process(dataset_path, galaxy_hid, method, threshold, up_distance,
             row_tmp[0] = row_tmp[0]
         # Print row_tmp.
         matched_pairs_output.writerow(row_tmp)
+        rows.append(row_tmp)
+    if index:
+        # Coordinate-sorted index for region queries, only needed with --index.
+        from cwpair2_index import INDEX_EXT, write_pair_index
+        write_pair_index(rows, make_path('data_%s' % MATCHED_PAIRS, INDEX_EXT, fname))
     statistics['paired'] = dist.size() * 2
     statistics['orphans'] = orphans
     statistics['final_mode'] = dist.mode()
@@ -443,6 +453,7 @@ if __name__ == '__main__':
     parser.add_argument('--relative_threshold', dest='relative_threshold', type=float, default=0.0, help='Percentage to filter the 95th percentile.')
     parser.add_argument('--absolute_threshold', dest='absolute_threshold', type=float, default=0.0, help='Absolute value to filter.')
     parser.add_argument('--output_files', dest='output_files', default='matched_pair', help='Restrict output dataset collections.')
+    parser.add_argument('--index', dest='index', action='store_true', help='Also write a region index for matched pairs.')
     parser.add_argument('--statistics_output', dest='statistics_output', help='Statistics output file.')
     args = parser.parse_args()
 
@@ -463,7 +474,8 @@ if __name__ == '__main__':
                                           args.up_distance,
                                           args.down_distance,
                                           args.binsize,
-                                          args.output_files)
+                                          args.output_files,
+                                          args.index)
         statistics.extend(stats)
     # Accumulate statistics.
     by_file = {}
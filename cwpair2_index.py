@@ -0,0 +1,228 @@
+"""
+cwpair2_index.py
+
+Coordinate-sorted index over the matched-pair (MP) output of cwpair2_gz.py, so that pairs
+falling inside many regions (e.g. FIMO/MEME motif windows) can be looked up without
+decompressing and scanning the score-sorted gff.gz file for every query.
+
+The index is a single .npz file holding every pair sorted by (chromosome, start), with the
+offset of each chromosome block and the widest pair on it (used to bound interval lookups).
+
+Build an index from an existing MP file:
+    python3 cwpair2_index.py build data_MP/data_MP_<name>.gff.gz data_MP/data_MP_<name>.npz
+
+Report the pairs overlapping each region of a BED file:
+    python3 cwpair2_index.py query data_MP/data_MP_<name>.npz meme_1_fimo.bed > overlaps.tabular
+
+Coordinates: pairs are stored 0-based and half-open (GFF start - 1, GFF end), the same convention
+as the BED regions they are queried with, and are reported back in their original 1-based, closed
+GFF coordinates. Regions, scores and cw_distance are reported exactly as written in the BED and
+GFF files.
+"""
+
+import argparse
+import csv
+import gzip
+import sys
+
+import numpy as np
+
+INDEX_EXT = 'npz'
+GZIP_MAGIC = b'\x1f\x8b'
+QUERY_FIELDS = ('region_chrom', 'region_start', 'region_end', 'region_name',
+                'chrom', 'start', 'end', 'score', 'cw_distance')
+
+
+def open_text(filepath):
+    # Kept independent of cwpair2_gz so importing this module does not pull in its matplotlib setup
+    with open(filepath, 'rb') as test_f:
+        if test_f.read(2) == GZIP_MAGIC:
+            return gzip.open(filepath, 'rt')
+    return open(filepath, 'r')
+
+
+def parse_cw_distance(attrs):
+    for attr in attrs.split(';'):
+        key, _, value = attr.partition('=')
+        if key == 'cw_distance':
+            return value
+    return '.'
+
+
+def read_pairs(reader):
+    """
+    Returns the gff rows of a cwpair2 matched-pair file as tuples.
+    """
+    rows = []
+    for line in reader:
+        line = line.rstrip("\r\n")
+        if not line or line.startswith('#'):
+            continue
+        rows.append(tuple(line.split("\t")))
+    return rows
+
+
+def write_pair_index(rows, index_path):
+    """
+    Writes an index for matched-pair gff rows, as produced by cwpair2_gz.gff_row:
+    (cname, source, type, start, end, score, strand, phase, attrs).
+    The 1-based, closed gff coordinates are stored 0-based and half-open to match BED;
+    score and cw_distance keep their gff text so query output joins back to the file.
+    """
+    n = len(rows)
+    names = np.array([row[0] for row in rows], dtype=str)
+    start = np.fromiter((int(row[3]) - 1 for row in rows), dtype=np.int64, count=n)
+    end = np.fromiter((int(row[4]) for row in rows), dtype=np.int64, count=n)
+    score = np.array([str(row[5]) for row in rows], dtype=str)
+    cw_distance = np.array([parse_cw_distance(str(row[8])) for row in rows], dtype=str)
+    chroms, chrom_ids = np.unique(names, return_inverse=True)
+    # Sort by chromosome, then by position to facilitate binary search
+    order = np.lexsort((start, chrom_ids))
+    chrom_ids = chrom_ids[order]
+    start = start[order]
+    end = end[order]
+    offsets = np.searchsorted(chrom_ids, np.arange(len(chroms) + 1))
+    max_span = np.zeros(len(chroms), dtype=np.int64)
+    if n:
+        np.maximum.at(max_span, chrom_ids, end - start)
+    # np.savez appends the extension itself, so write through an open file handle
+    with open(index_path, 'wb') as index_file:
+        np.savez(index_file,
+                 chroms=chroms,
+                 offsets=offsets,
+                 max_span=max_span,
+                 start=start,
+                 end=end,
+                 score=score[order],
+                 cw_distance=cw_distance[order])
+
+
+def build_pair_index(gff_path, index_path):
+    """
+    Indexes an existing cwpair2 matched-pair gff(.gz) file.
+    """
+    with open_text(gff_path) as input:
+        rows = read_pairs(input)
+    write_pair_index(rows, index_path)
+
+
+def read_bed(bed_path):
+    """
+    Returns the chromosome, start, end and name columns of a BED file as arrays.
+    Regions without a name column get '.'.
+    """
+    chroms = []
+    starts = []
+    ends = []
+    names = []
+    with open_text(bed_path) as input:
+        for line in input:
+            if not line.strip() or line.startswith(('#', 'track', 'browser')):
+                continue
+            fields = line.rstrip("\r\n").split("\t")
+            chroms.append(fields[0])
+            starts.append(int(fields[1]))
+            ends.append(int(fields[2]))
+            names.append(fields[3] if len(fields) > 3 else '.')
+    return (np.array(chroms, dtype=str), np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64),
+            np.array(names, dtype=str))
+
+
+class PairIndex(object):
+
+    def __init__(self, index_path):
+        with np.load(index_path) as data:
+            self.chroms = data['chroms']
+            self.offsets = data['offsets']
+            self.max_span = data['max_span']
+            self.start = data['start']
+            self.end = data['end']
+            self.score = data['score']
+            self.cw_distance = data['cw_distance']
+        self.chrom_ids = dict((cname, i) for i, cname in enumerate(self.chroms.tolist()))
+
+    def __len__(self):
+        return len(self.start)
+
+    def overlaps(self, chroms, starts, ends):
+        """
+        Returns (region, pair) index arrays for every pair overlapping a 0-based,
+        half-open BED region [start, end), with all regions looked up in one batch.
+        """
+        chroms = np.asarray(chroms, dtype=str)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        lo = np.zeros(len(starts), dtype=np.int64)
+        hi = np.zeros(len(starts), dtype=np.int64)
+        for cname in np.unique(chroms):
+            i = self.chrom_ids.get(cname)
+            if i is None:
+                continue
+            regions = np.flatnonzero(chroms == cname)
+            first, last = self.offsets[i], self.offsets[i + 1]
+            keys = self.start[first:last]
+            # A pair can only overlap a region if it starts less than its span before it
+            lo[regions] = first + np.searchsorted(keys, starts[regions] - self.max_span[i], side='right')
+            hi[regions] = first + np.searchsorted(keys, ends[regions], side='left')
+        counts = np.maximum(hi - lo, 0)
+        region = np.repeat(np.arange(len(starts)), counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair = np.repeat(lo, counts) + within
+        keep = self.end[pair] > starts[region]
+        return region[keep], pair[keep]
+
+    def query(self, chroms, starts, ends, names=None):
+        """
+        Returns the pairs overlapping each 0-based, half-open region as a dict of arrays keyed
+        by QUERY_FIELDS, plus 'region', the position of the matching region in the input.
+        Pair start/end are reported in their original 1-based, closed gff coordinates, and
+        score/cw_distance as their gff text.
+        """
+        chroms = np.asarray(chroms, dtype=str)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        if names is None:
+            names = np.full(len(starts), '.')
+        names = np.asarray(names, dtype=str)
+        region, pair = self.overlaps(chroms, starts, ends)
+        offsets = self.offsets[1:]
+        return {'region': region,
+                'region_chrom': chroms[region],
+                'region_start': starts[region],
+                'region_end': ends[region],
+                'region_name': names[region],
+                'chrom': self.chroms[np.searchsorted(offsets, pair, side='right')],
+                'start': self.start[pair] + 1,
+                'end': self.end[pair],
+                'score': self.score[pair],
+                'cw_distance': self.cw_distance[pair]}
+
+
+def query_pairs(index_path, bed_path):
+    """
+    Returns the pairs overlapping every region of a BED file.
+    """
+    return PairIndex(index_path).query(*read_bed(bed_path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index cwpair2 matched pairs and query them by region.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='Index a matched-pair gff(.gz) file.')
+    build_parser.add_argument('gff_file', type=str, help='Path to the matched-pair gff(.gz) file')
+    build_parser.add_argument('index_file', type=str, help='Path to write the .%s index' % INDEX_EXT)
+    query_parser = subparsers.add_parser('query', help='Report pairs overlapping the regions of a BED file.')
+    query_parser.add_argument('index_file', type=str, help='Path to the .%s index' % INDEX_EXT)
+    query_parser.add_argument('bed_file', type=str, help='Path to the BED(.gz) file of regions')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_pair_index(args.gff_file, args.index_file)
+    else:
+        hits = query_pairs(args.index_file, args.bed_file)
+        output = csv.writer(sys.stdout, delimiter='\t', lineterminator="\n")
+        output.writerow(QUERY_FIELDS)
+        output.writerows(zip(*(hits[field].tolist() for field in QUERY_FIELDS)))
+
+if __name__ == '__main__':
+    main()